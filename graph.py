@@ -1,7 +1,21 @@
+import array
 import collections
-import itertools
+import concurrent.futures
+import heapq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 class Tree:
+    __slots__ = ('root', 'branches')
+
     def __init__(self, root, branches=()):
         self.root = root
         self.branches = list(branches)
@@ -13,50 +27,154 @@ class Tree:
             return 'Tree({!r}, {!r})'.format(self.root, self.branches)
 
     def postorder(self):
-        for b in self.branches:
-            yield from b.postorder()
-        yield self.root
+        stack = [(self, iter(self.branches))]
+        while stack:
+            node, branches = stack[-1]
+            for b in branches:
+                stack.append((b, iter(b.branches)))
+                break
+            else:
+                stack.pop()
+                yield node.root
+
+_EMPTY = ()
+
+# Largest edge weight for which shortest_path uses Dial's bucket queue.
+_MAX_DIAL_WEIGHT = 128
 
 class Graph:
+    __slots__ = ('_id', '_label', '_indptr', '_indices', '_transpose')
+
     def __init__(self, edges=()):
-        self.G = collections.defaultdict(set)
+        ids = {}
+        label = []
+        pairs = set()
         for u, v in edges:
-            self.G[u].add(v)
+            uid = ids.get(u)
+            if uid is None:
+                uid = ids[u] = len(label)
+                label.append(u)
+            vid = ids.get(v)
+            if vid is None:
+                vid = ids[v] = len(label)
+                label.append(v)
+            pairs.add((uid, vid))
+        self._id = ids
+        self._label = label
+        self._indptr, self._indices = _csr(pairs, len(label))
+        self._transpose = None
 
     def __repr__(self):
         return 'Graph({!r})'.format(list(self.edges()))
 
     def vertices(self):
-        return self.G.keys()
+        return self._label
 
     def neighbors(self, v):
-        return self.G[v]
+        uid = self._id.get(v)
+        if uid is None:
+            return _EMPTY
+        label = self._label
+        indices = self._indices
+        return tuple(label[indices[k]]
+            for k in range(self._indptr[uid], self._indptr[uid + 1]))
 
     def outdegree(self, v):
-        return len(self.neighbors(v))
+        uid = self._id.get(v)
+        if uid is None:
+            return 0
+        return self._indptr[uid + 1] - self._indptr[uid]
 
     def indegree(self, v):
         return self.transpose().outdegree(v)
 
     def edges(self):
-        for u in self.G:
-            for v in self.G[u]:
-                yield (u, v)
+        label = self._label
+        indptr = self._indptr
+        indices = self._indices
+        for uid in range(len(label)):
+            u = label[uid]
+            for k in range(indptr[uid], indptr[uid + 1]):
+                yield (u, label[indices[k]])
 
     def transpose(self):
-        return Graph((v, u) for u, v in self.edges())
+        if self._transpose is None:
+            indptr = self._indptr
+            indices = self._indices
+            n = len(self._label)
+            pairs = set()
+            for uid in range(n):
+                for k in range(indptr[uid], indptr[uid + 1]):
+                    pairs.add((indices[k], uid))
+            T = Graph._from_pairs(self._id, self._label, pairs)
+            T._transpose = self
+            self._transpose = T
+        return self._transpose
+
+    @classmethod
+    def _from_pairs(cls, ids, label, pairs):
+        """Build a graph directly from an id mapping, a label table, and a
+        set of (source id, target id) pairs, skipping edge re-parsing.
+        """
+        g = cls()
+        g._id = ids
+        g._label = label
+        g._indptr, g._indices = _csr(pairs, len(label))
+        return g
 
     def union(self, other):
-        return Graph(itertools.chain(self.edges(), other.edges()))
+        ids = dict(self._id)
+        label = list(self._label)
+        trans = array.array('i', [0]) * len(other._label)
+        for i, v in enumerate(other._label):
+            j = ids.get(v)
+            if j is None:
+                j = ids[v] = len(label)
+                label.append(v)
+            trans[i] = j
+        pairs = set()
+        indptr = self._indptr
+        indices = self._indices
+        for u in range(len(self._label)):
+            for k in range(indptr[u], indptr[u + 1]):
+                pairs.add((u, indices[k]))
+        indptr = other._indptr
+        indices = other._indices
+        for u in range(len(other._label)):
+            tu = trans[u]
+            for k in range(indptr[u], indptr[u + 1]):
+                pairs.add((tu, trans[indices[k]]))
+        return Graph._from_pairs(ids, label, pairs)
 
     def undirected(self):
-        return self.union(self.transpose())
+        indptr = self._indptr
+        indices = self._indices
+        pairs = set()
+        for u in range(len(self._label)):
+            for k in range(indptr[u], indptr[u + 1]):
+                v = indices[k]
+                pairs.add((u, v))
+                pairs.add((v, u))
+        return Graph._from_pairs(self._id, self._label, pairs)
 
     def spanning_tree(self, v, visited=None):
         if visited is None:
             visited = set()
         visited.add(v)
-        return Tree(v, self.spanning_forest(self.neighbors(v), visited))
+        root = Tree(v)
+        stack = [(root, iter(self.neighbors(v)))]
+        while stack:
+            node, neighbors = stack[-1]
+            for w in neighbors:
+                if w not in visited:
+                    visited.add(w)
+                    child = Tree(w)
+                    node.branches.append(child)
+                    stack.append((child, iter(self.neighbors(w))))
+                    break
+            else:
+                stack.pop()
+        return root
 
     def spanning_forest(self, vertices=None, visited=None):
         if vertices is None:
@@ -67,35 +185,220 @@ class Graph:
             if v not in visited:
                 yield self.spanning_tree(v, visited)
 
-    def ccs(self):
+    def _np_csr(self):
+        """Return zero-copy NumPy views of the CSR arrays."""
+        return (numpy.frombuffer(self._indptr, dtype=numpy.intc),
+            numpy.frombuffer(self._indices, dtype=numpy.intc))
+
+    def _postorder_ids(self):
+        """Return all vertex ids in DFS postorder."""
+        n = len(self._label)
+        if njit is not None:
+            indptr, indices = self._np_csr()
+            sources = numpy.arange(n, dtype=numpy.intc)
+            visited = numpy.zeros(n, dtype=numpy.uint8)
+            return _dfs_postorder_csr(indptr, indices, sources, visited)
+        return list(self._dfs_postorder(range(n), bytearray(n)))
+
+    def _dfs_postorder(self, sources, visited):
+        """Yield the ids of vertices reachable from the source ids in
+        postorder, without materializing the DFS tree. visited is a
+        bytearray flag per vertex id, shared across calls.
+        """
+        indptr = self._indptr
+        indices = self._indices
+        for s in sources:
+            if visited[s]:
+                continue
+            visited[s] = 1
+            stack = [(s, iter(indices[indptr[s]:indptr[s + 1]]))]
+            while stack:
+                v, neighbors = stack[-1]
+                for w in neighbors:
+                    if not visited[w]:
+                        visited[w] = 1
+                        stack.append((w, iter(indices[indptr[w]:indptr[w + 1]])))
+                        break
+                else:
+                    stack.pop()
+                    yield v
+
+    def _forest(self, lo, hi):
+        """Return the DFS forest components rooted at ids lo..hi, as lists of
+        vertex ids.
+        """
+        n = len(self._label)
+        if njit is not None:
+            indptr, indices = self._np_csr()
+            visited = numpy.zeros(n, dtype=numpy.uint8)
+            source = numpy.empty(1, dtype=numpy.intc)
+            components = []
+            for u in range(lo, hi):
+                if not visited[u]:
+                    source[0] = u
+                    order = _dfs_postorder_csr(indptr, indices, source, visited)
+                    components.append(list(order))
+            return components
+        visited = bytearray(n)
+        return [list(self._dfs_postorder([u], visited))
+            for u in range(lo, hi) if not visited[u]]
+
+    def ccs(self, workers=None):
         """Return a list of connected components of the graph. Each conencted
         component is a list of vertices.
+
+        With workers, the DFS from each root runs speculatively across a
+        thread pool and overlapping results are reconciled afterwards; the
+        resulting partition is the same as the sequential one. This pays off
+        when the compiled kernels are available to release the GIL.
         """
-        return [list(t.postorder()) for t in self.spanning_forest()]
+        label = self._label
+        n = len(label)
+        if not workers or workers <= 1 or n == 0:
+            return [[label[v] for v in comp] for comp in self._forest(0, n)]
+        bounds = [(n * k) // workers for k in range(workers + 1)]
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            results = list(executor.map(self._forest,
+                bounds[:-1], bounds[1:]))
+        # Workers start from their own chunk of roots with no shared visited
+        # state, so a later worker may re-discover vertices an earlier root
+        # already reached; keep only the unclaimed part of each component.
+        claimed = bytearray(n)
+        components = []
+        for chunk in results:
+            for comp in chunk:
+                members = [v for v in comp if not claimed[v]]
+                if members:
+                    for v in members:
+                        claimed[v] = 1
+                    components.append([label[v] for v in members])
+        return components
 
     def linearize(self):
         """Return a list of vertices in a topological order. The first vertex
         will have no incoming edges, and the last vertix will have no outgoing
         edges.
         """
-        for t in self.spanning_forest():
-            yield from reversed(tuple(t.postorder()))
+        label = self._label
+        return [label[v] for v in reversed(self._postorder_ids())]
 
     def reachable(self, u, v):
         """Return True iff there is a directed path from u to v."""
-        return any(w == v for w in self.spanning_tree(u).postorder())
+        if u == v:
+            return True
+        uid = self._id.get(u)
+        vid = self._id.get(v)
+        if uid is None or vid is None:
+            return False
+        indptr = self._indptr
+        indices = self._indices
+        seen = bytearray(len(self._label))
+        seen[uid] = 1
+        stack = [uid]
+        while stack:
+            x = stack.pop()
+            for k in range(indptr[x], indptr[x + 1]):
+                w = indices[k]
+                if w == vid:
+                    return True
+                if not seen[w]:
+                    seen[w] = 1
+                    stack.append(w)
+        return False
 
     def acyclic(self):
         """Return True iff the graph is acyclic."""
-        post = {v: i for i, v in enumerate(self.linearize())}
-        return all(post[u] < post[v] for u, v in self.edges())
+        indptr = self._indptr
+        indices = self._indices
+        n = len(self._label)
+        order = self._postorder_ids()
+        # An edge u -> v is consistent iff v finishes before u in postorder.
+        if numpy is not None:
+            post = numpy.empty(n, dtype=numpy.intc)
+            post[order] = numpy.arange(n, dtype=numpy.intc)
+            np_indptr, np_indices = self._np_csr()
+            u_arr = numpy.repeat(numpy.arange(n, dtype=numpy.intc),
+                numpy.diff(np_indptr))
+            return bool((post[u_arr] > post[np_indices]).all())
+        post = array.array('i', [0]) * n
+        for i, v in enumerate(order):
+            post[v] = i
+        return all(post[u] > post[indices[k]]
+            for u in range(n) for k in range(indptr[u], indptr[u + 1]))
+
+    def _tarjan(self):
+        """Return the strongly connected components as lists of vertex ids,
+        in reverse topological order, using Tarjan's single-pass iterative
+        algorithm. Each edge is visited once and no transpose is needed.
+        """
+        n = len(self._label)
+        if njit is not None:
+            scc_id, ncomp = _tarjan_scc_csr(*self._np_csr())
+            components = [[] for _ in range(ncomp)]
+            for v in range(n):
+                components[scc_id[v]].append(v)
+            return components
+        indptr = self._indptr
+        indices = self._indices
+        index = array.array('i', [-1]) * n
+        lowlink = array.array('i', [0]) * n
+        on_stack = bytearray(n)
+        comp_stack = []
+        components = []
+        next_index = 0
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            index[root] = lowlink[root] = next_index
+            next_index += 1
+            comp_stack.append(root)
+            on_stack[root] = 1
+            stack = [(root, iter(indices[indptr[root]:indptr[root + 1]]))]
+            while stack:
+                v, neighbors = stack[-1]
+                for w in neighbors:
+                    if index[w] == -1:
+                        index[w] = lowlink[w] = next_index
+                        next_index += 1
+                        comp_stack.append(w)
+                        on_stack[w] = 1
+                        stack.append((w, iter(indices[indptr[w]:indptr[w + 1]])))
+                        break
+                    elif on_stack[w] and index[w] < lowlink[v]:
+                        lowlink[v] = index[w]
+                else:
+                    stack.pop()
+                    if stack and lowlink[v] < lowlink[stack[-1][0]]:
+                        lowlink[stack[-1][0]] = lowlink[v]
+                    if lowlink[v] == index[v]:
+                        scc = []
+                        while True:
+                            w = comp_stack.pop()
+                            on_stack[w] = 0
+                            scc.append(w)
+                            if w == v:
+                                break
+                        components.append(scc)
+        return components
+
+    def _scc_ids(self):
+        """Return (components, scc_id) where components is the _tarjan
+        component list and scc_id maps each vertex id to the index of its
+        component.
+        """
+        components = self._tarjan()
+        scc_id = array.array('i', [0]) * len(self._label)
+        for k, scc in enumerate(components):
+            for v in scc:
+                scc_id[v] = k
+        return components, scc_id
 
     def sccs(self):
         """Return a list of strongly connected components of the graph. Each
         strongly connected component is a list of vertices.
         """
-        return [list(t.postorder())
-            for t in self.transpose().spanning_forest(self.linearize())]
+        label = self._label
+        return [[label[v] for v in scc] for scc in reversed(self._tarjan())]
 
     def condensation(self):
         """Return directed acyclic graph. The vertices of the returned graph
@@ -104,51 +407,285 @@ class Graph:
         as if all of the strongly connected components are "condensed" into a
         single vertex.
         """
-        contract = {}
-        for scc in self.sccs():
-            S = frozenset(scc)
-            for v in S:
-                contract[v] = S
-        return Graph((contract[u], contract[v])
-            for u, v in self.edges() if contract[u] != contract[v])
-
-    def shortest_path(self, s, t, weight=lambda e: 1):
+        label = self._label
+        indptr = self._indptr
+        indices = self._indices
+        n = len(label)
+        components, scc_id = self._scc_ids()
+        contract = [frozenset(label[v] for v in scc) for scc in components]
+        pairs = set()
+        for u in range(n):
+            a = scc_id[u]
+            for k in range(indptr[u], indptr[u + 1]):
+                b = scc_id[indices[k]]
+                if a != b:
+                    pairs.add((a, b))
+        return Graph((contract[a], contract[b]) for a, b in pairs)
+
+    def edge_weights(self, weights):
+        """Convert a dictionary mapping edges to lengths into an array
+        aligned with the internal edge order, which shortest_path looks up
+        by position instead of hashing an edge tuple per relaxation. Worth
+        doing once when the same weights are used for many queries.
+        """
+        label = self._label
+        indptr = self._indptr
+        indices = self._indices
+        typecode = 'q' if all(isinstance(w, int) for w in weights.values()) else 'd'
+        out = array.array(typecode, [0]) * len(indices)
+        for u in range(len(label)):
+            lu = label[u]
+            for k in range(indptr[u], indptr[u + 1]):
+                out[k] = weights[(lu, label[indices[k]])]
+        return out
+
+    def shortest_path(self, s, t, weight=None, weights=None):
         """Return the shortest path from s to t, as a list of vertices starting
         with s and ending with t. If there is no path, return None.
 
-        The weight parameter is a function that takes an edge and returns the
-        length of that edge. One way to do this is with a dictionary:
+        With no weight argument every edge has length 1. The weight parameter
+        is a function that takes an edge and returns the length of that edge.
+        Alternatively, pass a dictionary mapping edges to lengths as the
+        weights parameter:
 
         edges = []
         weights = {}
-        for u, v, weight in weighted_edges:
+        for u, v, w in weighted_edges:
             e = (u, v)
             edges.append(e)
             weights[e] = w
         g = Graph(edges)
-        g.shortest_path(start, end, lambda e: weights[e])
+        g.shortest_path(start, end, weights=weights)
+
+        For repeated queries with the same weights, pass the result of
+        g.edge_weights(weights) instead of the dictionary itself.
         """
-        dist = {s: 0}
-        prev = {s: None}
-        Q = {s}
-        while Q:
-            u = min(Q, key=dist.get)
-            Q.remove(u)
-            if u == t:
-                break
-            for v in self.neighbors(u):
-                alt = dist[u] + weight((u, v))
-                if v not in dist or alt < dist[v]:
-                    Q.add(v)
-                    dist[v] = alt
-                    prev[v] = u
-        if t not in prev:
+        if s == t:
+            return [s]
+        sid = self._id.get(s)
+        tid = self._id.get(t)
+        if sid is None or tid is None:
+            return None
+        label = self._label
+        indptr = self._indptr
+        indices = self._indices
+        n = len(label)
+        # A non-dict weights argument is an array parallel to the internal
+        # edge order (see edge_weights), indexed directly instead of keying a
+        # dict with a fresh edge tuple per relaxation.
+        weights_arr = None
+        if weights is not None and not isinstance(weights, dict):
+            weights_arr = weights
+        wvalues = None
+        if weights is not None:
+            wvalues = weights_arr if weights_arr is not None else weights.values()
+        prev = array.array('i', [-1]) * n
+        done = bytearray(n)
+        if weight is None and weights is None:
+            # Unit weights: Dijkstra degenerates to BFS, no heap needed.
+            done[sid] = 1
+            Q = collections.deque([sid])
+            while Q:
+                u = Q.popleft()
+                if u == tid:
+                    break
+                for k in range(indptr[u], indptr[u + 1]):
+                    v = indices[k]
+                    if not done[v]:
+                        done[v] = 1
+                        prev[v] = u
+                        Q.append(v)
+        elif (wvalues is not None and len(wvalues)
+                and all(isinstance(w, int) and 0 <= w <= _MAX_DIAL_WEIGHT
+                    for w in wvalues)):
+            # Small non-negative integer weights: Dial's bucket queue.
+            # Pending distances all lie within maxw of the current one, so
+            # maxw + 1 circular buckets suffice.
+            maxw = max(wvalues)
+            nb = maxw + 1
+            dist = array.array('d', [float('inf')]) * n
+            dist[sid] = 0
+            buckets = [[] for _ in range(nb)]
+            buckets[0].append(sid)
+            pending = 1
+            d = 0
+            while pending:
+                bucket = buckets[d % nb]
+                while bucket:
+                    u = bucket.pop()
+                    pending -= 1
+                    if done[u] or dist[u] != d:
+                        continue
+                    done[u] = 1
+                    if u == tid:
+                        pending = 0
+                        break
+                    for k in range(indptr[u], indptr[u + 1]):
+                        v = indices[k]
+                        if weights_arr is not None:
+                            alt = d + weights_arr[k]
+                        else:
+                            alt = d + weights[(label[u], label[v])]
+                        if alt < dist[v]:
+                            dist[v] = alt
+                            prev[v] = u
+                            buckets[alt % nb].append(v)
+                            pending += 1
+                d += 1
+        else:
+            dist = array.array('d', [float('inf')]) * n
+            dist[sid] = 0
+            Q = [(0, sid)]
+            while Q:
+                d, u = heapq.heappop(Q)
+                if done[u]:
+                    continue
+                done[u] = 1
+                if u == tid:
+                    break
+                for k in range(indptr[u], indptr[u + 1]):
+                    v = indices[k]
+                    if weights_arr is not None:
+                        w = weights_arr[k]
+                    elif weights is not None:
+                        w = weights[(label[u], label[v])]
+                    else:
+                        w = weight((label[u], label[v]))
+                    alt = d + w
+                    if alt < dist[v]:
+                        dist[v] = alt
+                        prev[v] = u
+                        heapq.heappush(Q, (alt, v))
+        if not done[tid]:
             return None
         path = []
-        while t is not None:
-            path.append(t)
-            t = prev[t]
-        return reversed(path)
+        while tid != -1:
+            path.append(label[tid])
+            tid = prev[tid]
+        path.reverse()
+        return path
+
+def _dfs_postorder_csr(indptr, indices, sources, visited):
+    """Kernel for _dfs_postorder over NumPy CSR arrays: return the ids newly
+    reachable from sources as an array in postorder, marking them in visited.
+    Compiled with Numba when available.
+    """
+    n = indptr.shape[0] - 1
+    order = numpy.empty(n, dtype=numpy.intc)
+    stack_v = numpy.empty(n, dtype=numpy.intc)
+    stack_e = numpy.empty(n, dtype=numpy.intc)
+    count = 0
+    for i in range(sources.shape[0]):
+        s = sources[i]
+        if visited[s]:
+            continue
+        visited[s] = 1
+        top = 0
+        stack_v[0] = s
+        stack_e[0] = indptr[s]
+        while top >= 0:
+            v = stack_v[top]
+            e = stack_e[top]
+            advanced = False
+            while e < indptr[v + 1]:
+                w = indices[e]
+                e += 1
+                if not visited[w]:
+                    stack_e[top] = e
+                    visited[w] = 1
+                    top += 1
+                    stack_v[top] = w
+                    stack_e[top] = indptr[w]
+                    advanced = True
+                    break
+            if not advanced:
+                order[count] = v
+                count += 1
+                top -= 1
+    return order[:count]
+
+def _tarjan_scc_csr(indptr, indices):
+    """Kernel for _tarjan over NumPy CSR arrays: return (scc_id, ncomp) where
+    scc_id[v] numbers components in reverse topological order. Compiled with
+    Numba when available.
+    """
+    n = indptr.shape[0] - 1
+    index = numpy.full(n, -1, dtype=numpy.intc)
+    lowlink = numpy.empty(n, dtype=numpy.intc)
+    on_stack = numpy.zeros(n, dtype=numpy.uint8)
+    scc_id = numpy.empty(n, dtype=numpy.intc)
+    comp_stack = numpy.empty(n, dtype=numpy.intc)
+    stack_v = numpy.empty(n, dtype=numpy.intc)
+    stack_e = numpy.empty(n, dtype=numpy.intc)
+    comp_top = -1
+    next_index = 0
+    ncomp = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = lowlink[root] = next_index
+        next_index += 1
+        comp_top += 1
+        comp_stack[comp_top] = root
+        on_stack[root] = 1
+        top = 0
+        stack_v[0] = root
+        stack_e[0] = indptr[root]
+        while top >= 0:
+            v = stack_v[top]
+            e = stack_e[top]
+            advanced = False
+            while e < indptr[v + 1]:
+                w = indices[e]
+                e += 1
+                if index[w] == -1:
+                    stack_e[top] = e
+                    index[w] = lowlink[w] = next_index
+                    next_index += 1
+                    comp_top += 1
+                    comp_stack[comp_top] = w
+                    on_stack[w] = 1
+                    top += 1
+                    stack_v[top] = w
+                    stack_e[top] = indptr[w]
+                    advanced = True
+                    break
+                elif on_stack[w] and index[w] < lowlink[v]:
+                    lowlink[v] = index[w]
+            if not advanced:
+                top -= 1
+                if top >= 0 and lowlink[v] < lowlink[stack_v[top]]:
+                    lowlink[stack_v[top]] = lowlink[v]
+                if lowlink[v] == index[v]:
+                    while True:
+                        w = comp_stack[comp_top]
+                        comp_top -= 1
+                        on_stack[w] = 0
+                        scc_id[w] = ncomp
+                        if w == v:
+                            break
+                    ncomp += 1
+    return scc_id, ncomp
+
+if njit is not None:
+    _dfs_postorder_csr = njit(cache=True, nogil=True)(_dfs_postorder_csr)
+    _tarjan_scc_csr = njit(cache=True, nogil=True)(_tarjan_scc_csr)
+
+def _csr(pairs, n):
+    """Build a compressed sparse row representation (indptr, indices) from a
+    collection of (source id, target id) pairs.
+    """
+    indptr = array.array('i', [0]) * (n + 1)
+    for uid, _ in pairs:
+        indptr[uid + 1] += 1
+    for uid in range(n):
+        indptr[uid + 1] += indptr[uid]
+    indices = array.array('i', [0]) * len(pairs)
+    slot = list(indptr[:n])
+    for uid, vid in pairs:
+        indices[slot[uid]] = vid
+        slot[uid] += 1
+    return indptr, indices
 
 # from http://en.wikipedia.org/wiki/Strongly_connected_component
 test_graph = Graph([